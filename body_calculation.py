@@ -1,10 +1,17 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import date
 import os
-import calendar
 import altair as alt
 
+# pyarrow's multithreaded CSV reader is much faster on long logs; fall back to pandas' C parser without it
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
 # ==================================================
 # Configuration
 # ==================================================
@@ -14,6 +21,10 @@ st.set_page_config(page_title="Health Dashboard", layout="wide")
 # Files
 # ==================================================
 FOOD_FILE = "food_log.csv"
+FOOD_COLUMNS = ["date", "meal", "food", "calories_in", "exercise", "calories_out"]
+FOOD_DTYPES = {"meal": "category", "food": "string", "exercise": "string",
+               "calories_in": "int32", "calories_out": "int32"}
+DATE_FORMAT = "%d/%m/%Y"
 
 # ==================================================
 # Food Database (example)
@@ -31,19 +42,42 @@ food_db = {
     "Milk (1 cup)": 122,
     "Yogurt (100g)": 59
 }
+FOOD_SERIES = pd.Series(food_db, name="kcal")
+
+# ==================================================
+# Calendar Cell Templates
+# ==================================================
+CELL_IN_MONTH = ('<td style="border:1px solid #ccc; padding:8px; vertical-align:top; background:{bg}; '
+                 'color:#000; font-weight:700; text-align:center;">{d}<br>{k} kcal</td>')
+CELL_OUT = '<td style="border:1px solid #ccc; padding:8px; background-color:#f5f5f5;"></td>'
 
 # ==================================================
 # Helper Functions
 # ==================================================
+def parse_dates(df):
+    # The pyarrow engine may already hand back typed dates; only parse strings
+    if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        df["date"] = pd.to_datetime(df["date"], format=DATE_FORMAT)
+    return df
+
+@st.cache_data(show_spinner=False)
+def _load_food_data(mtime):
+    # mtime is only the cache key, so edits to the file on disk invalidate it
+    df = pd.read_csv(FOOD_FILE, usecols=FOOD_COLUMNS, dtype=FOOD_DTYPES, engine=CSV_ENGINE)
+    return parse_dates(df)
+
 def load_food_data():
     if os.path.exists(FOOD_FILE):
-        return pd.read_csv(FOOD_FILE)
-    return pd.DataFrame(columns=["date", "meal", "food", "calories_in", "exercise", "calories_out"])
+        return _load_food_data(os.path.getmtime(FOOD_FILE))
+    return pd.DataFrame(columns=FOOD_COLUMNS).astype({"date": "datetime64[ns]"})
 
 def save_food_data(entries):
-    df = load_food_data()
-    df = pd.concat([df, pd.DataFrame(entries)], ignore_index=True)
-    df.to_csv(FOOD_FILE, index=False)
+    # Append only the new rows instead of rewriting the whole history
+    pd.DataFrame(entries, columns=FOOD_COLUMNS).to_csv(
+        FOOD_FILE, mode="a", header=not os.path.exists(FOOD_FILE),
+        index=False, date_format=DATE_FORMAT
+    )
+    _load_food_data.clear()
 
 # -------------------
 # Body Measurement
@@ -154,10 +188,10 @@ with food_tab:
         for meal in meals:
             st.markdown(f"### {meal}")
             foods_selected = st.multiselect(f"Select foods for {meal}", list(food_db.keys()), key=meal)
-            calories_in = sum([food_db[f] for f in foods_selected]) if foods_selected else 0
+            calories_in = int(FOOD_SERIES.loc[foods_selected].sum()) if foods_selected else 0
             st.write(f"Calories: {calories_in} kcal")
             meal_entries.append({
-                "date": log_date.strftime("%d/%m/%Y"),
+                "date": pd.Timestamp(log_date),
                 "meal": meal,
                 "food": ", ".join(foods_selected) if foods_selected else "",
                 "calories_in": calories_in,
@@ -174,7 +208,7 @@ with food_tab:
                 entry["exercise"] = exercise_item
             if exercise_item and calories_out>0:
                 meal_entries.append({
-                    "date": log_date.strftime("%d/%m/%Y"),
+                    "date": pd.Timestamp(log_date),
                     "meal":"Exercise","food":"","calories_in":0,
                     "exercise":exercise_item,"calories_out":calories_out
                 })
@@ -189,29 +223,30 @@ with food_tab:
 # -----------------------------
     df_food = load_food_data()
     if not df_food.empty:
-        df_food["date"] = pd.to_datetime(df_food["date"], dayfirst=True).dt.date
-        daily_summary = df_food.groupby("date").agg({
-            "calories_in":"sum",
-            "calories_out":"sum"
-        }).reset_index()
-        daily_summary["net_calories"] = daily_summary["calories_in"] - daily_summary["calories_out"]
+        daily_summary = df_food.assign(
+            net_calories=df_food["calories_in"] - df_food["calories_out"]
+        ).groupby("date")[["calories_in", "calories_out", "net_calories"]].sum().reset_index()
 
         # Add index starting from 1
         daily_summary.index = daily_summary.index + 1
         daily_summary.index.name = "No."
 
-        # Create a styled table with black text
-        def style_row(row):
-            if row.net_calories <= 2000:
-                bg_color = "#d4edda"  # green
-            elif row.net_calories <= 2500:
-                bg_color = "#fff3cd"  # yellow
-            else:
-                bg_color = "#f8d7da"  # red
-            return [f'background-color:{bg_color}; color:black']*len(row)  # black text
+        # Create a styled table with black text, one row colour per net total
+        net = daily_summary["net_calories"]
+        row_css = np.select(
+            [net <= 2000, net <= 2500],
+            ["background-color:#d4edda; color:black",   # green
+             "background-color:#fff3cd; color:black"],  # yellow
+            default="background-color:#f8d7da; color:black"  # red
+        )
+        table_css = pd.DataFrame(
+            np.repeat(row_css[:, None], daily_summary.shape[1], axis=1),
+            index=daily_summary.index, columns=daily_summary.columns
+        )
 
         st.markdown("### 📊 Daily Calories Summary (Table View)")
-        styled_table = daily_summary.style.apply(style_row, axis=1).format({
+        styled_table = daily_summary.style.apply(lambda _: table_css, axis=None).format({
+            "date": "{:%Y-%m-%d}",
             "calories_in": "{:.0f}",
             "calories_out": "{:.0f}",
             "net_calories": "{:.0f}"
@@ -223,9 +258,10 @@ with food_tab:
         st.dataframe(styled_table, use_container_width=True)
 
         st.markdown("### 📈 Calories Over Time")
-        chart = alt.Chart(daily_summary.melt(id_vars=["date"], value_vars=["calories_in","calories_out","net_calories"],
-                                            var_name="Type",value_name="Calories")
-                          ).mark_line(point=True).encode(
+        # Fold to long form in Vega-Lite instead of melting a copy in pandas
+        chart = alt.Chart(daily_summary).transform_fold(
+            ["calories_in","calories_out","net_calories"], as_=["Type","Calories"]
+        ).mark_line(point=True).encode(
             x=alt.X("date:T", title="Date"),
             y=alt.Y("Calories:Q", title="Calories"),
             color="Type:N",
@@ -250,27 +286,34 @@ with run_tab:
 # ==================================================
 with monthly_tab:
     st.title("📅 Monthly Calories Calendar")
-    df_food = load_food_data()
+    # df_food is loaded once per rerun by the Food & Exercise tab above
     if not df_food.empty:
-        df_food["date"] = pd.to_datetime(df_food["date"], dayfirst=True).dt.date
         col1,col2 = st.columns(2)
         with col1:
             selected_year = st.number_input("Year",2000,2100,date.today().year)
         with col2:
             selected_month = st.selectbox("Month",range(1,13),index=date.today().month-1,
                                          format_func=lambda x: date(1900,x,1).strftime('%B'))
-        df_month = df_food[(pd.to_datetime(df_food['date']).dt.year==selected_year)&
-                           (pd.to_datetime(df_food['date']).dt.month==selected_month)]
-
-        cal = calendar.Calendar(firstweekday=0)
-        month_days = cal.monthdatescalendar(selected_year,selected_month)
-        html = '<table style="width:100%;border-collapse:collapse;"><tr>' + \
-               ''.join(f'<th style="border:1px solid #ccc;padding:8px;text-align:center;">{day}</th>' for day in ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]) + '</tr>'
-        for week in month_days:
-            html += "<tr>"
-            for day in week:
-                if day.month == selected_month:
-                    calories = df_month[df_month['date'] == day]["calories_in"].sum() - df_month[df_month['date'] == day]["calories_out"].sum()
+        mask = (df_food["date"].dt.year == selected_year) & (df_food["date"].dt.month == selected_month)
+        df_month = df_food.loc[mask, ["date", "calories_in", "calories_out"]]
+
+        daily_totals = df_month.groupby("date")[["calories_in", "calories_out"]].sum()
+        net_by_date = daily_totals["calories_in"] - daily_totals["calories_out"]
+
+        # Monday-first grid of whole weeks covering the month
+        first_day = pd.Timestamp(selected_year, selected_month, 1)
+        n_weeks = -(-(first_day.weekday() + first_day.days_in_month) // 7)
+        grid = pd.date_range(first_day - pd.Timedelta(days=first_day.weekday()), periods=n_weeks * 7)
+        grid_days = grid.day.to_numpy().reshape(n_weeks, 7)
+        grid_in_month = (grid.month == selected_month).reshape(n_weeks, 7)
+        grid_net = net_by_date.reindex(grid, fill_value=0).to_numpy().reshape(n_weeks, 7)
+        parts = ['<table style="width:100%;border-collapse:collapse;"><tr>']
+        parts.extend(f'<th style="border:1px solid #ccc;padding:8px;text-align:center;">{day}</th>' for day in ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"])
+        parts.append('</tr>')
+        for week_days, week_in_month, week_net in zip(grid_days, grid_in_month, grid_net):
+            parts.append("<tr>")
+            for day, in_month, calories in zip(week_days, week_in_month, week_net):
+                if in_month:
                     # Set background color
                     if calories <= 2000:
                         bg_color = "#d4edda"  # green
@@ -278,13 +321,11 @@ with monthly_tab:
                         bg_color = "#fff3cd"  # yellow
                     else:
                         bg_color = "#f8d7da"  # red
-                    text_color = "#000"  # black text
-                    html += f'<td style="border:1px solid #ccc; padding:8px; vertical-align:top; background:{bg_color}; color:{text_color}; font-weight:700; text-align:center;">'
-                    html += f'{day.day}<br>{int(calories)} kcal</td>'
+                    parts.append(CELL_IN_MONTH.format(bg=bg_color, d=day, k=int(calories)))
                 else:
-                    html += '<td style="border:1px solid #ccc; padding:8px; background-color:#f5f5f5;"></td>'
-            html += "</tr>"
-        html+="</table>"
-        st.markdown(html,unsafe_allow_html=True)
+                    parts.append(CELL_OUT)
+            parts.append("</tr>")
+        parts.append("</table>")
+        st.markdown("".join(parts),unsafe_allow_html=True)
     else:
         st.info("No data available.")
@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import date
 import os
+from pathlib import Path
+from functools import lru_cache
+from calendar import Calendar, month_name, monthrange
 import altair as alt
 
 # ==================================================
@@ -15,6 +19,11 @@ st.set_page_config(
 
 FILE = "runs.csv"
 NOTES_FILE = "notes.csv"
+RUN_COLUMNS = ["date", "distance_km", "time_min", "pace_min_per_km"]
+RUN_DTYPES = {"distance_km": "float64", "time_min": "float64", "pace_min_per_km": "float64"}
+DATE_FORMAT = "%d/%m/%Y"
+STYLE_FILE = "style.css"
+NOTES_PER_PAGE = 10
 
 # ==================================================
 # Helpers
@@ -22,21 +31,44 @@ NOTES_FILE = "notes.csv"
 def to_minutes(h, m, s):
     return h * 60 + m + s / 60
 
+@st.cache_data(show_spinner=False)
+def _load_runs(mtime):
+    # mtime is only the cache key, so edits to the file on disk invalidate it
+    df = pd.read_csv(FILE, usecols=RUN_COLUMNS, dtype=RUN_DTYPES)
+    df["date"] = pd.to_datetime(df["date"], format=DATE_FORMAT)
+    # Sorted DatetimeIndex (unnamed, so "date" stays unambiguous) for month slicing
+    df = df.sort_values("date", kind="stable")
+    df.index = pd.DatetimeIndex(df["date"]).rename(None)
+    return df
+
 def load_runs():
     if os.path.exists(FILE):
-        return pd.read_csv(FILE)
-    return pd.DataFrame(columns=["date", "distance_km", "time_min", "pace_min_per_km"])
+        return _load_runs(os.path.getmtime(FILE))
+    return pd.DataFrame(columns=RUN_COLUMNS).astype({"date": "datetime64[ns]"})
 
 def save_run(run):
-    df = load_runs()
-    df = pd.concat([df, pd.DataFrame([run])], ignore_index=True)
-    df.to_csv(FILE, index=False)
+    # Append only the new row instead of rewriting the whole history
+    pd.DataFrame([run], columns=RUN_COLUMNS).to_csv(
+        FILE, mode="a", header=not os.path.exists(FILE),
+        index=False, date_format=DATE_FORMAT
+    )
+    _load_runs.clear()
 
+@lru_cache(maxsize=4096)
 def format_pace(p):
     m = int(p)
     s = int(round((p - m) * 60))
     return f"{m}:{s:02d}"
 
+def format_pace_series(p):
+    # Vectorized format_pace for a whole column of paces
+    m = p.astype(int)
+    s = ((p - m) * 60).round().astype(int)
+    return m.astype(str) + ":" + s.astype(str).str.zfill(2)
+
+def format_duration_series(t):
+    return (t // 60).astype(int).astype(str) + "h " + (t % 60).astype(int).astype(str) + "m"
+
 # ==================================================
 # Pace / Speed Helpers
 # ==================================================
@@ -73,159 +105,101 @@ def time_table_from_pace(pace_min_per_km):
 
     return rows
 
+# ==================================================
+# Calendar Cell Templates
+# ==================================================
+MONTH_CALENDAR = Calendar(firstweekday=0)  # Monday first
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+TH_STYLE = "padding:5px;text-align:center;border-bottom:1px solid #555;"
+WEEKDAY_HEADER_HTML = "<tr>" + "".join(f"<th style='{TH_STYLE}'>{wd}</th>" for wd in WEEKDAYS) + "</tr>"
+EMPTY_CELL = "<td style='padding:10px;border:1px solid #333;background:rgba(255,255,255,0.05);opacity:0.1;'></td>"
+DAY_CELL_TMPL = ("<td style='padding:10px;border:1px solid #333;background:rgba(255,255,255,0.05);text-align:center;'>"
+                 "<b>{d}</b><br>{km:.1f} km<br>{pace} min/km</td>")
+REST_DAY_CELL_TMPL = ("<td style='padding:10px;border:1px solid #333;background:rgba(255,255,255,0.05);opacity:0.35;text-align:center;'>"
+                      "<b>{d}</b><br>—</td>")
+
+def _fmt_cell(d, km, pace):
+    if np.isnan(pace):
+        return REST_DAY_CELL_TMPL.format(d=d)
+    return DAY_CELL_TMPL.format(d=d, km=km, pace=format_pace(pace))
+
+def hash_df(df):
+    return int(pd.util.hash_pandas_object(df).sum())
+
+@st.cache_data(show_spinner=False, max_entries=24)
+def render_month_html(year, month_num, df_hash, _month_df):
+    # _month_df is not hashed by the cache; df_hash identifies its contents
+    days_in_month = monthrange(year, month_num)[1]
+
+    # One pass over the month: total km and mean pace per day of month (NaN on rest days)
+    day_agg = _month_df.groupby(_month_df["date"].dt.day).agg(
+        {"distance_km": "sum", "pace_min_per_km": "mean"}
+    ).reindex(range(1, days_in_month + 1))
+    kms = day_agg["distance_km"].to_numpy()
+    paces = day_agg["pace_min_per_km"].to_numpy()
+
+    # Start HTML table
+    parts = ["<table style='width:100%;border-collapse:collapse;'>"]
+    
+    # Weekday header
+    parts.append(WEEKDAY_HEADER_HTML)
+
+    # Fill in days: itermonthdays yields whole weeks, with 0 for days outside the month
+    cells = [EMPTY_CELL if d == 0 else _fmt_cell(d, kms[d - 1], paces[d - 1])
+             for d in MONTH_CALENDAR.itermonthdays(year, month_num)]
+    grid = np.array(cells, dtype=object).reshape(-1, 7)
+    parts.extend("<tr>" + "".join(week) + "</tr>" for week in grid)
+    parts.append("</table>")
+    return "".join(parts)
+
 # ==================================================
 # Notes Helpers
 # ==================================================
+@st.cache_data(show_spinner=False)
+def _load_notes(mtime):
+    return index_notes(pd.read_csv(NOTES_FILE))
+
+def index_notes(df):
+    # Index by id (unnamed, keeping the column) so a note can be dropped by label
+    return df.set_index("id", drop=False).rename_axis(None)
+
 def load_notes():
     if os.path.exists(NOTES_FILE):
-        return pd.read_csv(NOTES_FILE)
-    return pd.DataFrame(columns=["id", "date", "title", "content"])
+        return _load_notes(os.path.getmtime(NOTES_FILE))
+    return index_notes(pd.DataFrame(columns=["id", "date", "title", "content"]))
 
 def save_notes(df):
     df.to_csv(NOTES_FILE, index=False)
+    _load_notes.clear()
+
+def append_note(note):
+    # Adding a note only appends its row; full rewrites are for edits and deletes
+    pd.DataFrame([note], columns=["id", "date", "title", "content"]).to_csv(
+        NOTES_FILE, mode="a", header=not os.path.exists(NOTES_FILE), index=False
+    )
+    _load_notes.clear()
 
 # ==================================================
 # ULTRA-PREMIUM GARMIN / STRAVA CSS (MOBILE FRIENDLY)
 # ==================================================
-st.markdown("""
-<style>
-/* ---------- Global ---------- */
-.block-container {
-    max-width: 100%;
-    padding: 1rem 1.2rem; /* smaller padding for mobile */
-}
-
-body {
-    background: radial-gradient(circle at top, #111 0%, #0b0b0b 60%);
-    color: #eaeaea;
-    font-family: Inter, system-ui, -apple-system, BlinkMacSystemFont;
-}
-
-/* ---------- Headings ---------- */
-h1, h2, h3 {
-    font-weight: 800;
-    letter-spacing: -0.5px;
-}
-
-/* ---------- Hero ---------- */
-.hero {
-    background: linear-gradient(135deg, #ff6a00, #ff9800);
-    padding: 24px;
-    border-radius: 20px;
-    box-shadow: 0 10px 40px #00000080;
-    margin-bottom: 20px;
-    text-align: center;
-}
-.hero h2 {
-    color: white;
-    font-size: 28px;
-}
-.hero p {
-    color: white;
-    opacity: 0.95;
-    font-size: 14px;
-}
-
-/* ---------- Cards ---------- */
-.card {
-    background: rgba(255,255,255,0.05);
-    backdrop-filter: blur(14px);
-    padding: 16px;
-    border-radius: 16px;
-    box-shadow: 0 10px 30px #00000060;
-    transition: transform 0.2s ease;
-    text-align: center;
-}
-.card:hover {
-    transform: translateY(-2px);
-}
-
-/* ---------- Metrics ---------- */
-.metric-value {
-    font-size: 28px;
-    font-weight: 800;
-    color: #ff8c00;
-}
-.metric-label {
-    font-size: 12px;
-    opacity: 0.75;
-}
-
-/* ---------- Buttons ---------- */
-.stButton>button {
-    background: linear-gradient(90deg, #ff6a00, #ff9800);
-    color: white;
-    border-radius: 14px;
-    height: 44px;
-    font-weight: 700;
-    border: none;
-    font-size: 14px;
-    box-shadow: 0 8px 20px #00000080;
-}
-.stButton>button:hover {
-    transform: scale(1.03);
-}
-
-/* ---------- Inputs ---------- */
-input, .stNumberInput input {
-    background: rgba(255,255,255,0.06);
-    border-radius: 8px;
-    border: 1px solid rgba(255,255,255,0.15);
-    color: white;
-}
-
-/* ---------- Tabs ---------- */
-div[role="tablist"] button {
-    background: rgba(255,255,255,0.06);
-    border-radius: 12px;
-    padding: 8px 16px;
-    font-weight: 600;
-    font-size: 14px;
-}
-div[role="tablist"] button[aria-selected="true"] {
-    background: linear-gradient(90deg, #ff6a00, #ff9800);
-    color: white;
-}
-
-/* ---------- Calendar ---------- */
-div.stMarkdown div.card {
-    font-size: 12px;
-    padding: 8px;
-}
-
-/* ---------- Mobile ---------- */
-@media (max-width: 768px) {
-    .block-container {
-        padding: 0.8rem;
-    }
-    .metric-value {
-        font-size: 20px;
-    }
-    .metric-label {
-        font-size: 10px;
-    }
-    .hero h2 {
-        font-size: 24px;
-    }
-    .hero p {
-        font-size: 12px;
-    }
-    input, .stNumberInput input {
-        font-size: 12px;
-    }
-}
-</style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def _css():
+    # Resolved next to this script so it loads regardless of the working directory
+    return Path(__file__).with_name(STYLE_FILE).read_text(encoding="utf-8")
+
+st.markdown(f"<style>{_css()}</style>", unsafe_allow_html=True)
 
 # ==================================================
 # HERO
 # ==================================================
-st.markdown("""
+HERO_HTML = """
 <div class="hero">
     <h2>🏃 Run Performance</h2>
     <p>Garmin-level insights. Strava-grade aesthetics.</p>
 </div>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(HERO_HTML, unsafe_allow_html=True)
 
 # ==================================================
 # MAIN TABS
@@ -382,7 +356,7 @@ with log:
     if st.button("Save Activity", key="l_btn"):
         t = to_minutes(h,m,s)
         save_run({
-            "date": d.strftime("%d/%m/%Y"),
+            "date": pd.Timestamp(d),
             "distance_km": km,
             "time_min": round(t,2),
             "pace_min_per_km": round(t/km,2)
@@ -397,8 +371,6 @@ with dash:
     if df.empty:
         st.info("No activities yet.")
     else:
-        df["date"] = pd.to_datetime(df["date"], dayfirst=True)
-
         # ------------------ Dashboard Cards ------------------
         c1, c2, c3, c4 = st.columns(4)
         for col, val, label in [
@@ -419,7 +391,7 @@ with dash:
         perf_tab, pace_tab = st.tabs(["Performance Trend", "Pace Trend"])
 
         # Prepare formatted Pace column for tooltips
-        df["Pace"] = df["pace_min_per_km"].apply(format_pace)
+        df["Pace"] = format_pace_series(df["pace_min_per_km"])
 
         with perf_tab:
             st.markdown("### Distance over Time")
@@ -443,7 +415,6 @@ with dash:
         st.markdown("<br>", unsafe_allow_html=True)  # Optional: small gap above table
         st.markdown("### 📋 Monthly Runs Data")
 
-        from calendar import month_name
         current_month = date.today().month
         current_year = date.today().year
         month_df = df[(df["date"].dt.month == current_month) & (df["date"].dt.year == current_year)]
@@ -454,8 +425,8 @@ with dash:
             # Format Date, Time, and Pace
             month_df_display = month_df.copy()
             month_df_display["Date"] = month_df_display["date"].dt.strftime("%d/%m/%Y")
-            month_df_display["Time"] = month_df_display["time_min"].apply(lambda t: f"{int(t//60)}h {int(t%60)}m")
-            month_df_display["Pace"] = month_df_display["pace_min_per_km"].apply(format_pace)
+            month_df_display["Time"] = format_duration_series(month_df_display["time_min"])
+            month_df_display["Pace"] = format_pace_series(month_df_display["pace_min_per_km"])
             
             # Select and rename columns
             month_df_display = month_df_display[["Date", "distance_km", "Time", "Pace"]]
@@ -471,16 +442,14 @@ with dash:
 # ==================================================
 # CALENDAR VIEW - Proper Table + Monthly Summary
 # ==================================================
-with calendar:
+@st.fragment
+def _calendar_fragment():
     st.markdown("### 📅 Monthly Training Calendar")
     df = load_runs()
     
     if df.empty:
         st.info("No activities logged yet.")
     else:
-        df["date"] = pd.to_datetime(df["date"], dayfirst=True)
-        from calendar import month_name, monthrange
-        
         # Month / Year selector
         c1, c2 = st.columns([1, 1])
         with c1:
@@ -490,12 +459,17 @@ with calendar:
         month_num = list(month_name).index(month)
         
         # Filter runs for selected month
-        month_df = df[(df["date"].dt.year == year) & (df["date"].dt.month == month_num)]
+        try:
+            month_df = df.loc[f"{year}-{month_num:02d}"]
+        except KeyError:
+            month_df = df.iloc[:0]
 
         # ------------------ Monthly Summary ------------------
-        total_km = month_df["distance_km"].sum()
-        avg_km = month_df["distance_km"].mean() if not month_df.empty else 0
-        avg_pace = month_df["pace_min_per_km"].mean() if not month_df.empty else 0
+        distances = month_df["distance_km"].to_numpy()
+        n_runs = distances.size
+        total_km = distances.sum()
+        avg_km = total_km / n_runs if n_runs else 0
+        avg_pace = month_df["pace_min_per_km"].to_numpy().mean() if n_runs else 0
 
         st.markdown(f"""
         <div class="card" style="display:flex;justify-content:space-around;margin-bottom:15px;">
@@ -506,69 +480,54 @@ with calendar:
         """, unsafe_allow_html=True)
 
         # ------------------ Table Calendar ------------------
-        first_weekday, days_in_month = monthrange(year, month_num)
-        weekdays = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+        st.markdown(render_month_html(year, month_num, hash_df(month_df), month_df), unsafe_allow_html=True)
 
-        # Start HTML table
-        table_html = "<table style='width:100%;border-collapse:collapse;'>"
-        
-        # Weekday header
-        table_html += "<tr>"
-        for wd in weekdays:
-            table_html += f"<th style='padding:5px;text-align:center;border-bottom:1px solid #555;'>{wd}</th>"
-        table_html += "</tr>"
-
-        # Fill in days
-        day_counter = 1 - ((first_weekday - 0) % 7)  # Align Monday as 0
-        while day_counter <= days_in_month:
-            table_html += "<tr>"
-            for i in range(7):
-                if day_counter < 1 or day_counter > days_in_month:
-                    # Empty cell
-                    table_html += "<td style='padding:10px;border:1px solid #333;background:rgba(255,255,255,0.05);opacity:0.1;'></td>"
-                else:
-                    d = pd.Timestamp(year=year, month=month_num, day=day_counter)
-                    day_runs = month_df[month_df["date"] == d]
-                    if not day_runs.empty:
-                        km = day_runs["distance_km"].sum()
-                        pace = format_pace(day_runs["pace_min_per_km"].mean())
-                        table_html += f"<td style='padding:10px;border:1px solid #333;background:rgba(255,255,255,0.05);text-align:center;'><b>{day_counter}</b><br>{km:.1f} km<br>{pace} min/km</td>"
-                    else:
-                        table_html += f"<td style='padding:10px;border:1px solid #333;background:rgba(255,255,255,0.05);opacity:0.35;text-align:center;'><b>{day_counter}</b><br>—</td>"
-                day_counter += 1
-            table_html += "</tr>"
-        table_html += "</table>"
-
-        st.markdown(table_html, unsafe_allow_html=True)
+with calendar:
+    _calendar_fragment()
 
 # ==================================================
 # BODY MEASUREMENT TAB - LINK TO 8501
 # ==================================================
-with body_measure:   # NEW TAB ADDED
+# Styled button consistent with your theme
+BODY_MEASURE_HTML = (
+    '<a href="http://localhost:8501/" target="_blank">'
+    '<button style="background: linear-gradient(90deg, #ff6a00, #ff9800);'
+    'color:white;padding:12px 24px;border:none;border-radius:14px;font-weight:700;'
+    'font-size:16px;box-shadow: 0 8px 20px #00000080;">'
+    'Open Advanced Body Measurement</button></a>'
+)
+
+@st.fragment
+def _body_measure_fragment():
     st.markdown("### 🧍 Go to Advanced Body Measurement System")
     st.markdown(
         """
         Click the button below to open your **Advanced Body Measurement** app.
         """)
-    
-    # Styled button consistent with your theme
-    st.markdown(
-        '<a href="http://localhost:8501/" target="_blank">'
-        '<button style="background: linear-gradient(90deg, #ff6a00, #ff9800);'
-        'color:white;padding:12px 24px;border:none;border-radius:14px;font-weight:700;'
-        'font-size:16px;box-shadow: 0 8px 20px #00000080;">'
-        'Open Advanced Body Measurement</button></a>',
-        unsafe_allow_html=True
-    )
+    st.markdown(BODY_MEASURE_HTML, unsafe_allow_html=True)
+
+with body_measure:   # NEW TAB ADDED
+    _body_measure_fragment()
 
 # ==================================================
 # NOTES TAB - Add / Edit / Delete / Search Notes
 # ==================================================
-with notes_tab:
+@st.fragment
+def _notes_fragment():
     st.markdown("### 📝 Training Notes")
     st.markdown("Keep track of thoughts, injuries, goals, or reflections.")
 
-    notes_df = load_notes()
+    # Kept in session state, reloaded whenever notes.csv changes on disk (e.g. another
+    # session added a note) so Update/Delete never rewrite the file from a stale frame
+    notes_mtime = os.path.getmtime(NOTES_FILE) if os.path.exists(NOTES_FILE) else None
+    if "notes_df" not in st.session_state or st.session_state.get("notes_mtime") != notes_mtime:
+        loaded = load_notes()
+        st.session_state["notes_df"] = loaded
+        st.session_state["notes_mtime"] = notes_mtime
+        # Re-seed the id counter on every (re)load so ids written by other sessions are never reused
+        loaded_next_id = int(loaded["id"].max()) + 1 if not loaded.empty else 1
+        st.session_state["next_note_id"] = max(st.session_state.get("next_note_id", 1), loaded_next_id)
+    notes_df = st.session_state["notes_df"]
 
     # ------------------ Add New Note ------------------
     with st.expander("➕ Add New Note", expanded=True):
@@ -583,56 +542,67 @@ with notes_tab:
                 st.warning("Title and note cannot be empty.")
             else:
                 new_note = {
-                    "id": int(notes_df["id"].max() + 1) if not notes_df.empty else 1,
+                    "id": st.session_state["next_note_id"],
                     "date": date.today().strftime("%d/%m/%Y"),
                     "title": note_title,
                     "content": note_content
                 }
-                notes_df = pd.concat(
-                    [notes_df, pd.DataFrame([new_note])],
-                    ignore_index=True
-                )
-                save_notes(notes_df)
+                append_note(new_note)
+                st.session_state["next_note_id"] += 1
+                # Reload on the next run so the appended note is picked up
+                del st.session_state["notes_df"]
                 st.success("Note saved ✔️")
                 st.rerun()
 
     st.divider()
 
     # ------------------ Search Notes ------------------
-    search_query = st.text_input(
-        "🔍 Search notes",
-        placeholder="Search by title or content"
-    )
+    # Inside a form the query only reruns the script when Search is submitted
+    with st.form("note_search", clear_on_submit=False):
+        search_query = st.text_input(
+            "🔍 Search notes",
+            placeholder="Search by title or content"
+        )
+        st.form_submit_button("Search")
 
+    # Plain substring match on lowercased text, no regex compile
     filtered_df = notes_df
-    if search_query.strip():
+    query = search_query.strip().lower()
+    if query:
         filtered_df = notes_df[
-            notes_df["title"].str.contains(search_query, case=False, na=False) |
-            notes_df["content"].str.contains(search_query, case=False, na=False)
+            notes_df["title"].str.lower().str.contains(query, regex=False, na=False) |
+            notes_df["content"].str.lower().str.contains(query, regex=False, na=False)
         ]
 
     # ------------------ Existing Notes ------------------
     if filtered_df.empty:
         st.info("No notes found.")
     else:
-        for idx, row in filtered_df.iterrows():
-            with st.expander(f"📌 {row['title']}  •  {row['date']}"):
+        # Only build the edit widgets for one page of notes per rerun
+        n_pages = -(-len(filtered_df) // NOTES_PER_PAGE)
+        page = st.number_input("Page", 1, n_pages, 1, key="notes_page") if n_pages > 1 else 1
+        page_df = filtered_df.iloc[(page - 1) * NOTES_PER_PAGE:page * NOTES_PER_PAGE]
+
+        rows = page_df[["id", "title", "date", "content"]].itertuples(index=True, name=None)
+        for idx, note_id, title, note_date, content in rows:
+            with st.expander(f"📌 {title}  •  {note_date}"):
                 edited_title = st.text_input(
                     "Edit Title",
-                    value=row["title"],
-                    key=f"title_{row['id']}"
+                    value=title,
+                    key=f"title_{note_id}"
                 )
                 edited_content = st.text_area(
                     "Edit Note",
-                    value=row["content"],
+                    value=content,
                     height=120,
-                    key=f"content_{row['id']}"
+                    key=f"content_{note_id}"
                 )
 
                 c1, c2 = st.columns(2)
 
                 # Update note
-                if c1.button("💾 Update", key=f"update_{row['id']}"):
+                if c1.button("💾 Update", key=f"update_{note_id}"):
+                    # notes_df is the session-state frame, so this updates it in place
                     notes_df.loc[idx, "title"] = edited_title
                     notes_df.loc[idx, "content"] = edited_content
                     save_notes(notes_df)
@@ -640,8 +610,12 @@ with notes_tab:
                     st.rerun()
 
                 # Delete note
-                if c2.button("🗑️ Delete", key=f"delete_{row['id']}"):
-                    notes_df = notes_df.drop(idx).reset_index(drop=True)
+                if c2.button("🗑️ Delete", key=f"delete_{note_id}"):
+                    # Dropped in place by id, which also updates the session-state frame
+                    notes_df.drop(index=note_id, inplace=True)
                     save_notes(notes_df)
                     st.warning("Note deleted")
                     st.rerun()
+
+with notes_tab:
+    _notes_fragment()